@@ -1,10 +1,18 @@
 import os
+import json
+import asyncio
 from dataclasses import dataclass, field
-from typing import List
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+WAYPOINTS_FILE = os.getenv("WAYPOINTS_FILE", "waypoints.json")
+
+# Coalesce bursts of waypoint edits into one write
+WAYPOINTS_SAVE_DELAY = 1.0  # seconds
+
 
 @dataclass
 class CommuteConfig:
@@ -16,38 +24,134 @@ class CommuteConfig:
     desired_arrival_time: str  # HH:MM format
     buffer_minutes: int = 10
     heavy_traffic_threshold: float = 1.3
-    waypoints: List[str] = field(default_factory=list)
+    traffic_cache_ttl: int = 90  # seconds
+    waypoints_file: Optional[str] = None  # persist stops here if set
+    # Ordered set of stops: dict keys keep insertion order with O(1) lookups
+    _waypoints: Dict[str, None] = field(default_factory=dict, init=False)
+    _waypoints_dirty: bool = field(default=False, init=False, repr=False)
+    _save_handle: Optional[asyncio.TimerHandle] = field(
+        default=None, init=False, repr=False
+    )
+
+    # Parsed once from check_time / desired_arrival_time
+    check_hour: int = field(init=False)
+    check_minute: int = field(init=False)
+    arrival_hour: int = field(init=False)
+    arrival_minute: int = field(init=False)
+    arrival_time: time = field(init=False)
+
+    def __post_init__(self):
+        self.check_hour, self.check_minute = map(int, self.check_time.split(":"))
+        self.arrival_hour, self.arrival_minute = map(
+            int, self.desired_arrival_time.split(":")
+        )
+        self.arrival_time = time(self.arrival_hour, self.arrival_minute)
 
     @classmethod
     def from_env(cls):
         """Load configuration from environment variables"""
-        return cls(
+        config = cls(
             work_address=os.getenv("WORK_ADDRESS"),
             home_address=os.getenv("HOME_ADDRESS"),
             check_time=os.getenv("CHECK_TIME", "17:00"),
             desired_arrival_time=os.getenv("DESIRED_ARRIVAL_TIME", "18:00"),
             buffer_minutes=int(os.getenv("BUFFER_MINUTES", "10")),
             heavy_traffic_threshold=float(os.getenv("TRAFFIC_THRESHOLD", "1.3")),
+            traffic_cache_ttl=int(os.getenv("TRAFFIC_CACHE_TTL", "90")),
+            waypoints_file=WAYPOINTS_FILE,
+        )
+        config.load_waypoints()
+        return config
+
+    def is_in_window(self, now: datetime) -> bool:
+        """Check if now is between check_time and 30 minutes after arrival"""
+        check_time = now.replace(
+            hour=self.check_hour, minute=self.check_minute, second=0
         )
+        return check_time <= now <= self.window_end(now)
+
+    def window_end(self, now: datetime) -> datetime:
+        """End of today's monitoring window: 30 minutes after arrival"""
+        arrival_time = now.replace(
+            hour=self.arrival_hour, minute=self.arrival_minute, second=0
+        )
+        return arrival_time + timedelta(minutes=30)
+
+    @property
+    def waypoints(self) -> List[str]:
+        """Stops on the way home, in the order they were added"""
+        return list(self._waypoints)
 
     def add_waypoint(self, address: str):
         """Add a stop on the way home"""
-        if address not in self.waypoints:
-            self.waypoints.append(address)
-            return True
-        return False
+        if address in self._waypoints:
+            return False
+        self._waypoints[address] = None
+        self._schedule_save()
+        return True
 
     def remove_waypoint(self, address: str):
         """Remove a stop"""
-        if address in self.waypoints:
-            self.waypoints.remove(address)
-            return True
-        return False
+        if address not in self._waypoints:
+            return False
+        del self._waypoints[address]
+        self._schedule_save()
+        return True
 
     def clear_waypoints(self):
         """Clear all waypoints"""
-        self.waypoints.clear()
+        self._waypoints.clear()
+        self._schedule_save()
 
     def get_full_route(self) -> List[str]:
         """Get complete route: work → waypoints → home"""
-        return [self.work_address] + self.waypoints + [self.home_address]
+        return [self.work_address, *self._waypoints, self.home_address]
+
+    def load_waypoints(self):
+        """Restore stops saved by a previous run"""
+        if not self.waypoints_file:
+            return
+        try:
+            with open(self.waypoints_file) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not load waypoints from {self.waypoints_file}: {e}")
+            return
+
+        if not isinstance(saved, list) or not all(isinstance(wp, str) for wp in saved):
+            print(f"⚠️  Ignoring {self.waypoints_file}: expected a list of stops")
+            return
+        self._waypoints = dict.fromkeys(saved)
+
+    def save_waypoints(self):
+        """Write pending stop changes to disk atomically"""
+        if self._save_handle:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if not self._waypoints_dirty:
+            return
+        tmp_file = self.waypoints_file + ".tmp"
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(list(self._waypoints), f)
+            os.replace(tmp_file, self.waypoints_file)
+            self._waypoints_dirty = False
+        except OSError as e:
+            print(f"⚠️  Could not save waypoints to {self.waypoints_file}: {e}")
+
+    def _schedule_save(self):
+        """Mark stops as changed and save them after a short delay"""
+        if not self.waypoints_file:
+            return
+        self._waypoints_dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to debounce on, write immediately
+            self.save_waypoints()
+            return
+        if self._save_handle:
+            self._save_handle.cancel()
+        self._save_handle = loop.call_later(WAYPOINTS_SAVE_DELAY, self.save_waypoints)
@@ -1,8 +1,13 @@
 import os
+import signal
 import schedule
 import time
 import asyncio
-from datetime import datetime, timedelta
+import hashlib
+import functools
+import traceback
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
 from config import CommuteConfig
 from traffic_monitor import TrafficMonitor
 from telegram_bot import TelegramCommuteBot
@@ -10,29 +15,67 @@ from telegram_bot import TelegramCommuteBot
 class SmartCommuteAssistant:
     """Main application orchestrating the commute assistant"""
 
+    # Suppress repeats of the same early warning for this many seconds
+    NOTIFICATION_TTL = 30 * 60
+
     def __init__(self):
         # Load configuration
         self.config = CommuteConfig.from_env()
 
         # Initialize components
+        self.http_client = TrafficMonitor.create_client()
         self.traffic_monitor = TrafficMonitor(
-            os.getenv('GOOGLE_MAPS_API_KEY')
+            os.getenv('GOOGLE_MAPS_API_KEY'),
+            cache_ttl=self.config.traffic_cache_ttl,
+            client=self.http_client
         )
         self.telegram_bot = TelegramCommuteBot(
             token=os.getenv('TELEGRAM_BOT_TOKEN'),
             chat_id=os.getenv('TELEGRAM_CHAT_ID'),
             config=self.config
         )
+        self.telegram_bot.on_check = self._forced_check
 
         # State tracking
         self.last_notification_time = None
-        self.notification_sent_today = False
-
-    def check_traffic_and_notify(self):
+        # Notification fingerprint -> monotonic expiry time
+        self._sent: Dict[str, float] = {}
+
+        # Scheduled jobs currently running on the event loop
+        self._tasks = set()
+        # Serializes traffic checks; created on the running loop (Python 3.8
+        # binds asyncio.Lock to the loop current at construction)
+        self._check_lock: Optional[asyncio.Lock] = None
+
+    async def check_traffic_and_notify(self,
+                                       force_refresh: bool = False,
+                                       now: Optional[datetime] = None):
         """Main logic: Check traffic and send notification if needed"""
-        current_time = datetime.now()
+        # Scheduled ticks and /check run as separate tasks; without the lock two
+        # overlapping checks could both see an alert as unsent and both send it
+        if self._check_lock is None:
+            self._check_lock = asyncio.Lock()
+        async with self._check_lock:
+            await self._check_traffic(force_refresh, now)
+
+    async def _forced_check(self):
+        """Run a cache-bypassing check on user request (/check)"""
+        await self.check_traffic_and_notify(force_refresh=True)
+
+    async def _check_traffic(self, force_refresh: bool, now: Optional[datetime]):
+        """Run one traffic check; callers must hold _check_lock"""
+        current_time = now or datetime.now()
+
+        # Don't spend API quota outside the monitoring window, unless asked to
+        if not force_refresh and not self.config.is_in_window(current_time):
+            return
+
         print(f"\n🕐 Checking traffic at {current_time.strftime('%H:%M:%S')}")
 
+        # Drop expired notification fingerprints
+        now_mono = time.monotonic()
+        self._sent = {fp: expiry for fp, expiry in self._sent.items() if expiry > now_mono}
+
         # Get route with all waypoints
         route = self.config.get_full_route()
         origin = route[0]
@@ -46,10 +89,11 @@ class SmartCommuteAssistant:
         print(f"   → {destination}")
 
         # Get current traffic data
-        traffic_data = self.traffic_monitor.get_route_with_traffic(
+        traffic_data = await self.traffic_monitor.get_route_with_traffic(
             origin=origin,
             destination=destination,
-            waypoints=waypoints
+            waypoints=waypoints,
+            force_refresh=force_refresh
         )
 
         if not traffic_data:
@@ -59,10 +103,31 @@ class SmartCommuteAssistant:
         # Calculate when to leave
         departure_time, travel_minutes = self.traffic_monitor.calculate_departure_time(
             traffic_data,
-            self.config.desired_arrival_time,
-            self.config.buffer_minutes
+            self.config.arrival_time,
+            self.config.buffer_minutes,
+            now=current_time
         )
 
+        # Calculate time until departure
+        time_until_departure = (departure_time - current_time).total_seconds() / 60
+
+        # Departure and late alerts share one fingerprint: once either went
+        # out for today's route, neither repeats until the window closes
+        today = current_time.date()
+        leave_fp = self._fingerprint('leave', today)
+        early_fp = self._fingerprint('early', today, departure_time)
+        # Set once heavy traffic has been reported for today's route
+        heavy_fp = self._fingerprint('heavy', today)
+        leave_sent = self._was_sent(leave_fp)
+
+        # Nothing can be sent this tick - skip formatting the full status
+        if time_until_departure > 30 or (time_until_departure < 0 and leave_sent):
+            print(f"🏁 Recommended departure: {departure_time.strftime('%H:%M')} "
+                  f"({int(time_until_departure)} min)")
+            if time_until_departure > 30:
+                print("⏳ Too early to leave, continuing to monitor...")
+            return
+
         # Analyze traffic
         traffic_status = self.traffic_monitor.analyze_traffic(
             traffic_data,
@@ -74,106 +139,181 @@ class SmartCommuteAssistant:
             traffic_data['total_duration_traffic']
         )
 
-        # Calculate time until departure
-        time_until_departure = (departure_time - current_time).total_seconds() / 60
-
         # Print status
         print(f"⏱️  Travel time: {travel_time_str}")
         print(f"🚦 Traffic: {traffic_status}")
         print(f"🏁 Recommended departure: {departure_time.strftime('%H:%M')}")
         print(f"⏰ Minutes until departure: {int(time_until_departure)}")
 
-        # Send notifications based on timing
-        if 0 <= time_until_departure <= 5 and not self.notification_sent_today:
+        # Collect notifications for this tick and send them as one message
+        pending_sections = []
+        pending_fps = []
+        leave_ttl = max(
+            self.NOTIFICATION_TTL,
+            (self.config.window_end(current_time) - current_time).total_seconds()
+        )
+
+        heavy_traffic = traffic_data['traffic_ratio'] >= self.config.heavy_traffic_threshold
+
+        if 0 <= time_until_departure <= 5 and not leave_sent:
             # Time to leave!
-            asyncio.run(self._send_departure_notification(
+            pending_sections.append(self._departure_section(
                 travel_time_str,
                 traffic_data,
                 traffic_status
             ))
-            self.notification_sent_today = True
+            pending_fps.append((leave_fp, leave_ttl))
             self.last_notification_time = current_time
 
-        elif (traffic_data['traffic_ratio'] >= self.config.heavy_traffic_threshold 
+            # Heavy traffic no early warning covered - report it in the same message
+            if heavy_traffic and not self._was_sent(heavy_fp):
+                delay = traffic_data['total_duration_traffic'] - traffic_data['total_duration']
+                pending_sections.append(
+                    self.telegram_bot.format_heavy_traffic_note(self._format_duration(delay))
+                )
+                pending_fps.append((heavy_fp, leave_ttl))
+
+        elif (heavy_traffic
               and 5 < time_until_departure <= 20
-              and not self.notification_sent_today):
-            # Heavy traffic - send early warning
-            asyncio.run(self._send_early_warning(
+              and not leave_sent
+              and not self._was_sent(early_fp)):
+            # Heavy traffic - send early warning, main alert still follows
+            pending_sections.append(self._early_warning_section(
                 travel_time_str,
                 int(time_until_departure),
                 traffic_status
             ))
-            # Don't set notification_sent_today yet, still need to send main alert
-
-        elif time_until_departure > 30:
-            print("⏳ Too early to leave, continuing to monitor...")
+            pending_fps.append((early_fp, self.NOTIFICATION_TTL))
+            pending_fps.append((heavy_fp, leave_ttl))
 
         elif time_until_departure < 0:
             print("⚠️  You should have already left!")
-            if not self.notification_sent_today:
-                asyncio.run(self._send_late_warning(travel_time_str))
-                self.notification_sent_today = True
-
-    async def _send_departure_notification(self, 
-                                          travel_time: str,
-                                          traffic_data: dict,
-                                          traffic_status: str):
-        """Send the main departure notification"""
-        await self.telegram_bot.send_departure_alert(
+            if not leave_sent:
+                pending_sections.append(self._late_warning_section(travel_time_str))
+                pending_fps.append((leave_fp, leave_ttl))
+
+        if pending_sections and await self.telegram_bot.send_combined_alert(pending_sections):
+            for fp, ttl in pending_fps:
+                self._mark_sent(fp, ttl)
+
+    def _fingerprint(self,
+                     kind: str,
+                     day: date,
+                     departure_time: Optional[datetime] = None) -> str:
+        """Identify a notification by day, kind, route and optional departure slot"""
+        key = (day.isoformat(), kind, tuple(self.config.get_full_route()))
+        if departure_time:
+            # Round to 15 minutes so small traffic fluctuations don't re-notify
+            slot = departure_time.replace(minute=departure_time.minute - departure_time.minute % 15)
+            key += (slot.strftime('%H:%M'),)
+        return hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
+    def _was_sent(self, fingerprint: str) -> bool:
+        """Check if a notification was sent recently"""
+        return self._sent.get(fingerprint, 0) > time.monotonic()
+
+    def _mark_sent(self, fingerprint: str, ttl: float):
+        """Remember a notification to suppress duplicates for ttl seconds"""
+        self._sent[fingerprint] = time.monotonic() + ttl
+
+    def _departure_section(self,
+                           travel_time: str,
+                           traffic_data: dict,
+                           traffic_status: str) -> Tuple[str, str]:
+        """Build the main departure notification"""
+        return self.telegram_bot.format_departure_alert(
             travel_time=travel_time,
             route_summary=traffic_data['summary'],
             traffic_status=traffic_status,
             waypoints=traffic_data.get('waypoints', [])
         )
 
-    async def _send_early_warning(self, 
-                                 travel_time: str,
-                                 minutes_early: int,
-                                 traffic_status: str):
-        """Send early warning for heavy traffic"""
-        await self.telegram_bot.send_early_warning(
+    def _early_warning_section(self,
+                               travel_time: str,
+                               minutes_early: int,
+                               traffic_status: str) -> Tuple[str, str]:
+        """Build early warning for heavy traffic"""
+        return self.telegram_bot.format_early_warning(
             travel_time,
             minutes_early,
             traffic_status
         )
 
-    async def _send_late_warning(self, travel_time: str):
-        """Send warning if user is late"""
-        message = f"⚠️ *You're Running Late!*\n\n"
-        message += f"⏱️ *Travel time:* {travel_time}\n\n"
-        message += f"_Leave now to minimize delay!_"
-        await self.telegram_bot.send_notification("Late Alert", message)
-
-    def _format_duration(self, seconds: int) -> str:
+    def _late_warning_section(self, travel_time: str) -> Tuple[str, str]:
+        """Build warning if user is late"""
+        parts = [
+            "⚠️ *You're Running Late!*",
+            "",
+            f"⏱️ *Travel time:* {travel_time}",
+            "",
+            "_Leave now to minimize delay!_",
+        ]
+        return "Late Alert", "\n".join(parts)
+
+    @staticmethod
+    def _format_duration(seconds: int) -> str:
         """Format duration in seconds to readable string"""
-        minutes = int(seconds / 60)
+        # Only whole minutes are shown, so cache on minutes for better hit rate
+        return SmartCommuteAssistant._format_minutes(seconds // 60)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _format_minutes(minutes: int) -> str:
+        """Format duration in minutes to readable string"""
         if minutes < 60:
             return f"{minutes} min"
-        else:
-            hours = minutes // 60
-            mins = minutes % 60
-            return f"{hours}h {mins}min"
-
-    def _check_if_in_monitoring_window(self):
-        """Check if we're within the monitoring window"""
-        now = datetime.now()
-
-        # Reset daily flag at midnight
-        if now.hour == 0 and now.minute < 5:
-            self.notification_sent_today = False
+        hours, mins = divmod(minutes, 60)
+        return f"{hours}h {mins}min"
+
+    def _run_async_job(self, job):
+        """Run a coroutine job from the scheduler on the running event loop"""
+        task = asyncio.create_task(job())
+        self._tasks.add(task)
+        task.add_done_callback(self._on_job_done)
+
+    def _on_job_done(self, task: asyncio.Task):
+        """Forget a finished job and report it if it failed"""
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc:
+            print(f"❌ Scheduled check failed: {exc!r}")
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+    async def _scheduler_loop(self):
+        """Run pending scheduled jobs without blocking the event loop"""
+        while True:
+            schedule.run_pending()
+            # Sleep until the next job is due, waking at least every 30 seconds
+            idle = schedule.idle_seconds()
+            await asyncio.sleep(max(0.5, min(30.0, idle if idle is not None else 30.0)))
+
+    async def _run(self):
+        """Run the Telegram bot and the scheduler on a single event loop"""
+        # docker stop sends SIGTERM: cancel so the cleanup below still runs
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass  # Not supported on Windows
 
-        # Parse check time and arrival time
-        check_hour, check_minute = map(int, self.config.check_time.split(':'))
-        arrival_hour, arrival_minute = map(int, self.config.desired_arrival_time.split(':'))
+        await self.telegram_bot.start()
 
-        check_time = now.replace(hour=check_hour, minute=check_minute, second=0)
-        arrival_time = now.replace(hour=arrival_hour, minute=arrival_minute, second=0)
+        try:
+            # Run once immediately for testing
+            if os.getenv('RUN_ON_STARTUP') == '1':
+                print(f"\n🔍 Running initial check...")
+                await self.check_traffic_and_notify(force_refresh=True)
 
-        # Monitor from check_time until 30 minutes after arrival_time
-        end_time = arrival_time + timedelta(minutes=30)
+            print(f"\n✅ System is running. Press Ctrl+C to stop.")
+            print("="*60 + "\n")
 
-        if check_time <= now <= end_time:
-            self.check_traffic_and_notify()
+            await self._scheduler_loop()
+        finally:
+            self.config.save_waypoints()
+            await self.telegram_bot.stop()
+            await self.http_client.aclose()
 
     def start(self):
         """Start the commute assistant"""
@@ -190,24 +330,18 @@ class SmartCommuteAssistant:
         check_time = self.config.check_time
 
         # Main scheduled check
-        schedule.every().day.at(check_time).do(self.check_traffic_and_notify)
+        schedule.every().day.at(check_time).do(
+            self._run_async_job, self.check_traffic_and_notify
+        )
 
         # Continuous monitoring during window (every 5 minutes)
-        schedule.every(5).minutes.do(self._check_if_in_monitoring_window)
-
-        # Run once immediately for testing
-        print(f"\n🔍 Running initial check...")
-        self.check_traffic_and_notify()
-
-        # Start the scheduling loop
-        print(f"\n✅ System is running. Press Ctrl+C to stop.")
-        print("="*60 + "\n")
+        schedule.every(5).minutes.do(
+            self._run_async_job, self.check_traffic_and_notify
+        )
 
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(30)  # Check every 30 seconds
-        except KeyboardInterrupt:
+            asyncio.run(self._run())
+        except (KeyboardInterrupt, asyncio.CancelledError):
             print("\n\n👋 Smart Commute Assistant stopped")
 
 def main():
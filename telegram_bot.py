@@ -1,6 +1,8 @@
 import os
-from typing import Optional
+import re
+from typing import Awaitable, Callable, List, Optional, Tuple
 from telegram import Update, Bot
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application, 
     CommandHandler, 
@@ -10,6 +12,11 @@ from telegram.ext import (
 )
 import asyncio
 
+# Natural language patterns for handle_message
+_ADD_RE = re.compile(r'\b(?:add|stop at|stop by)\s+(\S.*?)\s*$', re.I)
+_CLEAR_RE = re.compile(r'clear.*stop', re.I)
+_STATUS_RE = re.compile(r'status|info', re.I)
+
 class TelegramCommuteBot:
     """Telegram bot for commute notifications and commands"""
 
@@ -17,60 +24,86 @@ class TelegramCommuteBot:
         self.token = token
         self.chat_id = chat_id
         self.config = config
-        self.bot = Bot(token=token)
+        # One keep-alive connection pool for every send, shared with the Application
+        self._request = HTTPXRequest(connection_pool_size=4, http_version="2")
+        self.bot = Bot(token=token, request=self._request)
         self.application = None
+        # Set by the main app to run a traffic check on /check
+        self.on_check: Optional[Callable[[], Awaitable[None]]] = None
 
-    async def send_notification(self, title: str, message: str, parse_mode: str = 'Markdown'):
-        """Send notification message"""
+    async def send_combined_alert(self,
+                                  sections: List[Tuple[str, str]],
+                                  parse_mode: str = 'Markdown'):
+        """Send several (title, message) sections as a single message"""
+        titles = ", ".join(title for title, _ in sections)
         try:
-            full_message = f"*{title}*\n\n{message}"
+            full_message = "\n\n".join(
+                f"*{title}*\n\n{message}" for title, message in sections
+            )
             await self.bot.send_message(
                 chat_id=self.chat_id,
                 text=full_message,
                 parse_mode=parse_mode
             )
-            print(f"✅ Telegram notification sent: {title}")
+            print(f"✅ Telegram notification sent: {titles}")
             return True
         except Exception as e:
             print(f"❌ Telegram error: {e}")
             return False
 
-    async def send_departure_alert(self, 
-                                   travel_time: str,
-                                   route_summary: str,
-                                   traffic_status: str,
-                                   waypoints: list):
-        """Send main departure notification"""
-        message = f"🏠 *Time to Head Home!*\n\n"
-        message += f"⏱️ *Travel time:* {travel_time}\n"
-        message += f"🚦 *Traffic:* {traffic_status}\n"
-        message += f"🗺️ *Best route:* {route_summary}\n"
+    def format_departure_alert(self,
+                               travel_time: str,
+                               route_summary: str,
+                               traffic_status: str,
+                               waypoints: list) -> Tuple[str, str]:
+        """Build main departure notification as (title, message)"""
+        parts: List[str] = [
+            "🏠 *Time to Head Home!*",
+            "",
+            f"⏱️ *Travel time:* {travel_time}",
+            f"🚦 *Traffic:* {traffic_status}",
+            f"🗺️ *Best route:* {route_summary}",
+        ]
 
         if waypoints:
-            message += f"\n📍 *Your stops:*\n"
-            for i, stop in enumerate(waypoints, 1):
-                message += f"   {i}. {stop['address']}\n"
+            parts += ["", "📍 *Your stops:*"]
+            parts += [f"   {i}. {stop['address']}" for i, stop in enumerate(waypoints, 1)]
+
+        parts += ["", "_Have a safe trip home!_ 🚗"]
+
+        return "Commute Alert", "\n".join(parts)
 
-        message += f"\n_Have a safe trip home!_ 🚗"
+    def format_early_warning(self,
+                             travel_time: str,
+                             minutes_early: int,
+                             traffic_status: str) -> Tuple[str, str]:
+        """Build early warning for heavy traffic as (title, message)"""
+        parts: List[str] = [
+            "⚠️ *Heavy Traffic Detected*",
+            "",
+            f"Consider leaving *{minutes_early} minutes early*",
+            "",
+            f"⏱️ *Current travel time:* {travel_time}",
+            f"🚦 {traffic_status}",
+            "",
+            "_I'll notify you again when it's time to leave._",
+        ]
 
-        await self.send_notification("Commute Alert", message)
+        return "Traffic Warning", "\n".join(parts)
 
-    async def send_early_warning(self, 
-                                travel_time: str,
-                                minutes_early: int,
-                                traffic_status: str):
-        """Send early warning for heavy traffic"""
-        message = f"⚠️ *Heavy Traffic Detected*\n\n"
-        message += f"Consider leaving *{minutes_early} minutes early*\n\n"
-        message += f"⏱️ *Current travel time:* {travel_time}\n"
-        message += f"🚦 {traffic_status}\n\n"
-        message += f"_I'll notify you again when it's time to leave._"
+    def format_heavy_traffic_note(self, delay: str) -> Tuple[str, str]:
+        """Build heavy traffic note to attach to a departure alert"""
+        parts: List[str] = [
+            "⚠️ *Heavy Traffic Detected*",
+            "",
+            f"Traffic is adding *{delay}* to your usual trip.",
+        ]
 
-        await self.send_notification("Traffic Warning", message)
+        return "Traffic Warning", "\n".join(parts)
 
     def setup_commands(self):
         """Setup bot command handlers"""
-        self.application = Application.builder().token(self.token).build()
+        self.application = Application.builder().bot(self.bot).build()
 
         # Command handlers
         self.application.add_handler(CommandHandler("start", self.cmd_start))
@@ -79,7 +112,10 @@ class TelegramCommuteBot:
         self.application.add_handler(CommandHandler("remove", self.cmd_remove_stop))
         self.application.add_handler(CommandHandler("stops", self.cmd_list_stops))
         self.application.add_handler(CommandHandler("clear", self.cmd_clear_stops))
-        self.application.add_handler(CommandHandler("check", self.cmd_check_now))
+        # Run /check concurrently so a slow traffic lookup doesn't hold up other updates
+        self.application.add_handler(
+            CommandHandler("check", self.cmd_check_now, block=False)
+        )
 
         # Message handler for natural language
         self.application.add_handler(
@@ -111,21 +147,25 @@ class TelegramCommuteBot:
 
     async def cmd_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /status command"""
-        message = f"📊 *Current Configuration*\n\n"
-        message += f"🏢 *Work:* {self.config.work_address}\n"
-        message += f"🏠 *Home:* {self.config.home_address}\n"
-        message += f"⏰ *Check time:* {self.config.check_time}\n"
-        message += f"🎯 *Target arrival:* {self.config.desired_arrival_time}\n"
-        message += f"⏱️ *Buffer:* {self.config.buffer_minutes} min\n\n"
-
-        if self.config.waypoints:
-            message += f"📍 *Active stops:*\n"
-            for i, stop in enumerate(self.config.waypoints, 1):
-                message += f"   {i}. {stop}\n"
+        parts: List[str] = [
+            "📊 *Current Configuration*",
+            "",
+            f"🏢 *Work:* {self.config.work_address}",
+            f"🏠 *Home:* {self.config.home_address}",
+            f"⏰ *Check time:* {self.config.check_time}",
+            f"🎯 *Target arrival:* {self.config.desired_arrival_time}",
+            f"⏱️ *Buffer:* {self.config.buffer_minutes} min",
+            "",
+        ]
+
+        waypoints = self.config.waypoints
+        if waypoints:
+            parts.append("📍 *Active stops:*")
+            parts += [f"   {i}. {stop}" for i, stop in enumerate(waypoints, 1)]
         else:
-            message += f"📍 *No stops configured*\n"
+            parts.append("📍 *No stops configured*")
 
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text("\n".join(parts), parse_mode='Markdown')
 
     async def cmd_add_stop(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /add command"""
@@ -174,15 +214,15 @@ class TelegramCommuteBot:
 
     async def cmd_list_stops(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /stops command"""
-        if not self.config.waypoints:
+        waypoints = self.config.waypoints
+        if not waypoints:
             await update.message.reply_text("You have no stops configured.")
             return
 
-        message = f"📍 *Your stops ({len(self.config.waypoints)}):*\n\n"
-        for i, stop in enumerate(self.config.waypoints, 1):
-            message += f"{i}. {stop}\n"
+        parts = [f"📍 *Your stops ({len(waypoints)}):*", ""]
+        parts += [f"{i}. {stop}" for i, stop in enumerate(waypoints, 1)]
 
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text("\n".join(parts), parse_mode='Markdown')
 
     async def cmd_clear_stops(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /clear command"""
@@ -199,29 +239,25 @@ class TelegramCommuteBot:
             "🔍 Checking traffic now...",
             parse_mode='Markdown'
         )
-        # This will be called by the main app
-        # Store the update context for callback
-        context.user_data['check_requested'] = True
+        if self.on_check:
+            await self.on_check()
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle natural language messages"""
-        text = update.message.text.lower()
+        text = update.message.text
 
         # Pattern matching for natural commands
-        if any(word in text for word in ['add', 'stop at', 'stop by']):
-            # Extract location (simple approach)
-            for keyword in ['add', 'stop at', 'stop by']:
-                if keyword in text:
-                    location = text.split(keyword, 1)[1].strip()
-                    if location:
-                        self.config.add_waypoint(location)
-                        await update.message.reply_text(
-                            f"✅ Added: *{location}*",
-                            parse_mode='Markdown'
-                        )
-                        return
-
-        elif 'clear' in text and 'stop' in text:
+        add_match = _ADD_RE.search(text)
+        if add_match:
+            location = add_match.group(1)
+            self.config.add_waypoint(location)
+            await update.message.reply_text(
+                f"✅ Added: *{location}*",
+                parse_mode='Markdown'
+            )
+            return
+
+        elif _CLEAR_RE.search(text):
             count = len(self.config.waypoints)
             self.config.clear_waypoints()
             await update.message.reply_text(
@@ -229,7 +265,7 @@ class TelegramCommuteBot:
             )
             return
 
-        elif 'status' in text or 'info' in text:
+        elif _STATUS_RE.search(text):
             await self.cmd_status(update, context)
             return
 
@@ -241,8 +277,16 @@ class TelegramCommuteBot:
             "• `/help` - See all commands"
         )
 
-    def run_bot(self):
-        """Start the bot (blocking)"""
+    async def start(self):
+        """Start polling on the running event loop (non-blocking)"""
         self.setup_commands()
+        await self.application.initialize()
+        await self.application.start()
+        await self.application.updater.start_polling()
         print("🤖 Telegram bot started")
-        self.application.run_polling()
\ No newline at end of file
+
+    async def stop(self):
+        """Stop polling and release network resources"""
+        await self.application.updater.stop()
+        await self.application.stop()
+        await self.application.shutdown()
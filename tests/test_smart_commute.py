@@ -0,0 +1,81 @@
+import asyncio
+import os
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import config
+import smart_commute
+from smart_commute import SmartCommuteAssistant
+
+ENV = {
+    "GOOGLE_MAPS_API_KEY": "test-key",
+    "TELEGRAM_BOT_TOKEN": "123456:TEST",
+    "TELEGRAM_CHAT_ID": "1",
+    "WORK_ADDRESS": "Work",
+    "HOME_ADDRESS": "Home",
+    "CHECK_TIME": "17:00",
+    "DESIRED_ARRIVAL_TIME": "18:30",
+    "BUFFER_MINUTES": "10",
+}
+
+
+class FixedDatetime(datetime):
+    """Three minutes before the 17:50 departure for a 30 min trip"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 10, 15, 17, 47)
+
+
+async def fake_route(**kwargs):
+    """Directions result for a 30 minute trip in light traffic"""
+    await asyncio.sleep(0)  # yield like a real request
+    return {
+        "total_duration": 1800,
+        "total_duration_traffic": 1800,
+        "traffic_ratio": 1.0,
+        "summary": "I-5",
+        "waypoints": [],
+    }
+
+
+class ConcurrentCheckTest(unittest.IsolatedAsyncioTestCase):
+    """Overlapping traffic checks must not send the same alert twice"""
+
+    async def asyncSetUp(self):
+        with mock.patch.dict(os.environ, ENV), \
+                mock.patch.object(config, "WAYPOINTS_FILE", None):
+            self.assistant = SmartCommuteAssistant()
+        self.assistant.traffic_monitor.get_route_with_traffic = fake_route
+
+        self.sent = []
+
+        async def fake_send(sections):
+            await asyncio.sleep(0)  # yield like a real send
+            self.sent.append([title for title, _ in sections])
+            return True
+
+        self.assistant.telegram_bot.send_combined_alert = fake_send
+
+        patcher = mock.patch.object(smart_commute, "datetime", FixedDatetime)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.assistant.http_client.aclose()
+
+    async def test_check_command_during_scheduled_tick_notifies_once(self):
+        update = mock.Mock()
+        update.message.reply_text = mock.AsyncMock()
+
+        await asyncio.gather(
+            self.assistant.check_traffic_and_notify(),
+            self.assistant.telegram_bot.cmd_check_now(update, mock.Mock()),
+        )
+
+        self.assertEqual(self.sent, [["Commute Alert"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,57 @@
-import requests
+import asyncio
+import bisect
+import functools
+import random
+import time
+import httpx
+import orjson
 from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime, time as dt_time, timedelta
+
+# Traffic ratio at which light traffic becomes moderate
+_MODERATE_TRAFFIC_RATIO = 1.1
+_TRAFFIC_LABELS = ("🟢 Light traffic", "🟡 Moderate traffic", "🔴 Heavy traffic")
+
+# Attempts per Directions request before giving up on this check
+_FETCH_ATTEMPTS = 3
 
 
 class TrafficMonitor:
     """Handles traffic data retrieval and route analysis"""
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        cache_ttl: int = 90,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
         self.api_key = api_key
         self.base_url = "https://maps.googleapis.com/maps/api/directions/json"
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[Tuple, Tuple[float, Dict]] = {}
+
+        # Keep-alive async client so checks don't block the event loop
+        self._client = client or self.create_client()
+        self._base_params = {"traffic_model": "best_guess", "key": api_key}
+
+    @staticmethod
+    def create_client() -> httpx.AsyncClient:
+        """Create an HTTP/2 client suited for Directions API calls"""
+        return httpx.AsyncClient(
+            timeout=10.0,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_keepalive_connections=4),
+            ),
+        )
 
-    def get_route_with_traffic(
-        self, origin: str, destination: str, waypoints: Optional[List[str]] = None
+    async def get_route_with_traffic(
+        self,
+        origin: str,
+        destination: str,
+        waypoints: Optional[List[str]] = None,
+        force_refresh: bool = False,
     ) -> Optional[Dict]:
         """
         Get route information with traffic data
@@ -20,62 +60,116 @@ class TrafficMonitor:
             origin: Starting location
             destination: Final destination
             waypoints: Optional list of stops along the way
+            force_refresh: Bypass the response cache and query the API
 
         Returns:
             Dictionary with route and traffic information
         """
+        # Serve recent results from cache, traffic changes slowly
+        cache_key = (origin, destination, tuple(waypoints or ()))
+        if not force_refresh:
+            cached = self._cache.get(cache_key)
+            if cached:
+                stored_at, route_data = cached
+                if time.monotonic() - stored_at < self.cache_ttl:
+                    return route_data
+                del self._cache[cache_key]
+
+        # The Directions API has no response field mask (only the newer Routes
+        # API does), so the full payload is fetched; httpx requests it gzipped
         params = {
+            **self._base_params,
             "origin": origin,
             "destination": destination,
             "departure_time": "now",
-            "traffic_model": "best_guess",
-            "key": self.api_key,
         }
 
         # Add waypoints if provided
         if waypoints:
             params["waypoints"] = "optimize:false|" + "|".join(waypoints)
 
+        response = await self._fetch_with_retry(params)
+        if response is None:
+            return None
+
         try:
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
 
             if data["status"] == "OK":
-                return self._parse_route_data(data, waypoints)
+                route_data = self._parse_route_data(data, waypoints)
+                self._cache[cache_key] = (time.monotonic(), route_data)
+                return route_data
             else:
                 print(
                     f"❌ API Error: {data['status']} - {data.get('error_message', '')}"
                 )
                 return None
 
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Request failed: {e}")
+        except (orjson.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+            print(f"❌ Unexpected API response: {e!r}")
             return None
 
+    async def _fetch_with_retry(self, params: Dict) -> Optional[httpx.Response]:
+        """
+        Call the Directions API, retrying transient failures
+
+        Timeouts, connection errors and 5xx responses are retried with
+        jittered exponential backoff; other errors fail immediately.
+
+        Returns:
+            Successful response, or None if all attempts failed
+        """
+        for attempt in range(_FETCH_ATTEMPTS):
+            try:
+                response = await self._client.get(
+                    self.base_url, params=params, timeout=10.0
+                )
+                response.raise_for_status()
+                return response
+            except httpx.HTTPStatusError as e:
+                print(f"❌ Request failed: {e}")
+                if e.response.status_code < 500:
+                    return None
+            except httpx.TransportError as e:
+                print(f"❌ Request failed: {e!r}")
+            except httpx.HTTPError as e:
+                print(f"❌ Request failed: {e}")
+                return None
+
+            if attempt < _FETCH_ATTEMPTS - 1:
+                await asyncio.sleep(0.3 * (2 ** attempt) + random.random() * 0.2)
+
+        return None
+
     def _parse_route_data(self, data: Dict, waypoints: Optional[List[str]]) -> Dict:
         """Parse Google Maps API response"""
         route = data["routes"][0]
         legs = route["legs"]
 
-        # Calculate total duration and distance
-        total_duration = sum(leg["duration"]["value"] for leg in legs)
-        total_duration_traffic = sum(
-            leg.get("duration_in_traffic", leg["duration"])["value"] for leg in legs
-        )
-        total_distance = sum(leg["distance"]["value"] for leg in legs)
-
-        # Parse waypoint information
-        stops = []
-        if waypoints:
-            for i, leg in enumerate(legs[:-1]):  # All legs except the last
-                stops.append(
-                    {
-                        "address": waypoints[i] if i < len(waypoints) else "Unknown",
-                        "duration_to_next": leg["duration"]["value"],
-                        "distance_to_next": leg["distance"]["value"],
-                    }
-                )
+        # Calculate totals and waypoint information in a single pass
+        last_leg = len(legs) - 1
+        total_duration = 0
+        total_duration_traffic = 0
+        total_distance = 0
+        stops: List[Optional[Dict]] = [None] * last_leg if waypoints else []
+        for i, leg in enumerate(legs):
+            duration = leg["duration"]["value"]
+            distance = leg["distance"]["value"]
+            total_duration += duration
+            total_duration_traffic += (
+                leg["duration_in_traffic"]["value"]
+                if "duration_in_traffic" in leg
+                else duration
+            )
+            total_distance += distance
+
+            # Every leg except the last ends at a stop
+            if waypoints and i < last_leg:
+                stops[i] = {
+                    "address": waypoints[i] if i < len(waypoints) else "Unknown",
+                    "duration_to_next": duration,
+                    "distance_to_next": distance,
+                }
 
         return {
             "total_duration": total_duration,
@@ -86,10 +180,14 @@ class TrafficMonitor:
             "waypoints": stops,
             "start_address": legs[0]["start_address"],
             "end_address": legs[-1]["end_address"],
-            "traffic_ratio": total_duration_traffic / total_duration,
+            "traffic_ratio": (
+                total_duration_traffic / total_duration if total_duration else 1.0
+            ),
         }
 
-    def _meters_to_text(self, meters: int) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _meters_to_text(meters: int) -> str:
         """Convert meters to readable text"""
         if meters < 1000:
             return f"{meters} m"
@@ -98,22 +196,27 @@ class TrafficMonitor:
             return f"{km:.1f} km"
 
     def calculate_departure_time(
-        self, traffic_data: Dict, arrival_time: str, buffer_minutes: int
+        self,
+        traffic_data: Dict,
+        arrival_time: dt_time,
+        buffer_minutes: int,
+        now: Optional[datetime] = None,
     ) -> Tuple[datetime, int]:
         """
         Calculate when to leave based on traffic
 
+        Args:
+            now: Reference time, defaults to the current time
+
         Returns:
             Tuple of (departure_time, travel_minutes)
         """
-        # Parse desired arrival time
-        arrival_hour, arrival_minute = map(int, arrival_time.split(":"))
-        today = datetime.now().replace(
-            hour=arrival_hour, minute=arrival_minute, second=0, microsecond=0
-        )
+        if now is None:
+            now = datetime.now()
+        today = datetime.combine(now.date(), arrival_time)
 
         # If arrival time has passed today, use tomorrow
-        if today < datetime.now():
+        if today < now:
             today += timedelta(days=1)
 
         # Calculate travel time with buffer
@@ -133,10 +236,5 @@ class TrafficMonitor:
             Traffic status emoji and text
         """
         ratio = traffic_data["traffic_ratio"]
-
-        if ratio >= threshold:
-            return "🔴 Heavy traffic"
-        elif ratio >= 1.1:
-            return "🟡 Moderate traffic"
-        else:
-            return "🟢 Light traffic"
+        thresholds = (min(_MODERATE_TRAFFIC_RATIO, threshold), threshold)
+        return _TRAFFIC_LABELS[bisect.bisect_right(thresholds, ratio)]